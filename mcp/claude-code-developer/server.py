@@ -5,103 +5,278 @@ Handles code generation, file analysis, and development tasks using actual Claud
 """
 
 import asyncio
+import errno
+import hashlib
 import json
-import subprocess
+import time
 import sys
 import os
 import tempfile
 import re
-from typing import Any, Dict, List
-from mcp.server import Server
-from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
-
-# Initialize MCP server
-server = Server("claude-code-developer")
-
-@server.list_tools()
-async def list_tools() -> List[Tool]:
-    return [
-        Tool(
-            name="generate_code",
-            description="Generate code for a feature using Claude Code CLI",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "feature": {"type": "string", "description": "Feature description"},
-                    "language": {"type": "string", "description": "Programming language"},
-                    "context": {"type": "string", "description": "Additional context (URL/file content)"},
-                    "output_dir": {"type": "string", "description": "Output directory", "default": "./"}
-                },
-                "required": ["feature", "language"]
-            }
-        ),
-        Tool(
-            name="analyze_file",
-            description="Analyze and improve existing code file",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "file_path": {"type": "string", "description": "Path to file to analyze"},
-                    "improvement_type": {"type": "string", "description": "Type of improvement needed"}
-                },
-                "required": ["file_path"]
-            }
-        ),
-        Tool(
-            name="create_feature_branch",
-            description="Create a new feature branch for development",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "feature_name": {"type": "string", "description": "Name of the feature"},
-                    "base_branch": {"type": "string", "description": "Base branch", "default": "main"}
-                },
-                "required": ["feature_name"]
-            }
-        ),
-        Tool(
-            name="analyze_url_content",
-            description="Fetch and analyze web content for code generation",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "url": {"type": "string", "description": "Web URL to analyze"},
-                    "language": {"type": "string", "description": "Target programming language"}
-                },
-                "required": ["url", "language"]
-            }
-        ),
-        Tool(
-            name="ask_claude",
-            description="Ask Claude Code directly for development assistance",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "prompt": {"type": "string", "description": "Prompt to send to Claude Code"},
-                    "working_dir": {"type": "string", "description": "Working directory", "default": "./"}
-                },
-                "required": ["prompt"]
-            }
-        )
-    ]
-
-@server.call_tool()
-async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
-    if name == "generate_code":
-        return await generate_code_handler(arguments)
-    elif name == "analyze_file":
-        return await analyze_file_handler(arguments)
-    elif name == "create_feature_branch":
-        return await create_feature_branch_handler(arguments)
-    elif name == "analyze_url_content":
-        return await analyze_url_content_handler(arguments)
-    elif name == "ask_claude":
-        return await ask_claude_handler(arguments)
-    else:
-        raise ValueError(f"Unknown tool: {name}")
-
-async def generate_code_handler(args: Dict[str, Any]) -> List[TextContent]:
+import pathlib
+import shutil
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+try:
+    # orjson parses multi-MB Claude responses several times faster than the json module
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+# Claude can emit multi-MB responses; 1 MiB pipes (Linux default is 64 KiB) let it
+# write them without stalling on every pipe-full wakeup.
+PIPE_SIZE = 1 << 20
+_pipesize = PIPE_SIZE
+
+# Prompt templates, formatted per call
+_GENERATE_PROMPT = """I need to implement a feature in {language}:
+Feature: {feature}
+Output directory: {output_dir}
+{context_block}
+Please:
+1. Create the necessary files for this feature
+2. Write clean, well-documented code
+3. Follow best practices for the language
+4. Include proper error handling
+5. Add comments explaining the implementation
+
+Generate the complete implementation ready for production use."""
+
+# analyze_file sends head + raw file bytes + tail, so the file is never decoded
+_ANALYZE_PROMPT_HEAD = """Please analyze this code file and provide {improvement_type} improvements:
+
+File: {file_path}
+
+Code:
+```
+"""
+
+_ANALYZE_PROMPT_TAIL = """
+```
+
+Please provide:
+1. Code quality assessment
+2. Specific improvement suggestions
+3. Best practices recommendations
+4. Security considerations (if applicable)
+5. Performance optimization opportunities
+6. Refactored code examples where beneficial
+
+Focus on {improvement_type} improvements."""
+
+_URL_PROMPT = """Please analyze the content at this URL and help me implement integration code:
+
+URL: {url}
+Target Language: {language}
+
+Please:
+1. Fetch and analyze the content at the URL
+2. Identify key information relevant for {language} integration
+3. Suggest implementation approach
+4. Provide code examples for integration
+5. Include error handling and best practices
+6. Consider security implications
+
+Generate ready-to-use {language} code for working with this URL/API."""
+
+# Characters that are not allowed in generated branch names
+_BRANCH_RE = re.compile(r'[^a-zA-Z0-9]')
+
+async def spawn(cmd: List[str], cwd: Optional[str] = None, stdin: bool = False) -> asyncio.subprocess.Process:
+    """Start a command with captured stdout/stderr (and a stdin pipe if requested)."""
+    # Keep the spawn on CPython's vfork/posix_spawn fast path (no fork + page-table copy):
+    # never add preexec_fn, user/group switching or start_new_session here, and pass the
+    # working directory through cwd= rather than calling os.chdir() first.
+    global _pipesize
+    kwargs = dict(
+        # Without input, don't let the child inherit (and read from) the MCP server's stdio stream
+        stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd
+    )
+    if _pipesize > 0:
+        try:
+            return await asyncio.create_subprocess_exec(*cmd, pipesize=_pipesize, **kwargs)
+        except OSError as e:
+            # The larger pipe is best effort: the kernel refuses it above pipe-max-size or
+            # once the user's pipe-user-pages quota is used up, so fall back to default pipes
+            if e.errno not in (errno.EPERM, errno.EINVAL, errno.EBUSY):
+                raise
+            _pipesize = -1
+    return await asyncio.create_subprocess_exec(*cmd, **kwargs)
+
+async def communicate(proc: asyncio.subprocess.Process, timeout: Optional[float] = None,
+                      input: Optional[bytes] = None) -> Tuple[int, bytes, bytes]:
+    """Feed input to a spawned process and collect raw (returncode, stdout, stderr).
+
+    The process is killed if the call doesn't complete, whether it timed out or the tool call
+    was cancelled (client cancellation or session close), so Claude can't keep editing files.
+    """
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(input), timeout=timeout)
+    except BaseException:
+        await asyncio.shield(kill(proc))
+        raise
+    return proc.returncode, stdout, stderr
+
+async def kill(proc: asyncio.subprocess.Process) -> None:
+    """Kill a process and reap it without letting a surviving grandchild block us."""
+    if proc.stdin is not None:
+        proc.stdin.close()
+    if proc.returncode is None:
+        proc.kill()
+    # wait() only returns once every pipe is closed, and a grandchild (e.g. when the CLI is a
+    # shell wrapper) may still hold them; drain what's left for a bounded time instead
+    pipes = [stream.read() for stream in (proc.stdout, proc.stderr) if stream is not None]
+    try:
+        await asyncio.wait_for(asyncio.gather(*pipes, proc.wait()), 5)
+    except asyncio.TimeoutError:
+        pass
+
+def decode(data: bytes) -> str:
+    """Decode captured output in one pass (cheaper than text=True's incremental decoder)."""
+    return data.decode("utf-8", "replace")
+
+async def run_command(cmd: List[str], timeout: Optional[float] = None, cwd: Optional[str] = None,
+                      input: Optional[bytes] = None) -> Tuple[int, str, str]:
+    """Run a command without blocking the event loop; returns (returncode, stdout, stderr)."""
+    proc = await spawn(cmd, cwd=cwd, stdin=input is not None)
+    returncode, stdout, stderr = await communicate(proc, timeout=timeout, input=input)
+    return returncode, decode(stdout), decode(stderr)
+
+# Resolve the CLI once instead of letting every exec walk PATH
+_CLAUDE = shutil.which("claude") or "claude"
+CLAUDE_CMD = [_CLAUDE, "-p", "--output-format", "json"]
+
+async def run_claude(prompt: Union[str, bytes], timeout: float, cwd: Optional[str] = None) -> Tuple[int, str, str]:
+    """Send a prompt to Claude Code in print mode; returns (returncode, response, stderr)."""
+    # One process per call: Claude Code has no multi-prompt mode that keeps contexts apart, and
+    # it gives up after ~3 s without stdin input, so it can't be pre-started either
+    proc = await spawn(CLAUDE_CMD, cwd=cwd, stdin=True)
+    # The prompt goes through stdin, not argv, so large file contents cannot hit ARG_MAX
+    returncode, stdout, stderr = await communicate(
+        proc,
+        timeout=timeout,
+        input=prompt.encode("utf-8") if isinstance(prompt, str) else prompt
+    )
+    # The JSON parser takes the raw bytes; output is only decoded when actually shown
+    try:
+        response = json_loads(stdout)
+    except ValueError:
+        response = None
+    if not isinstance(response, dict):
+        return returncode, decode(stdout), decode(stderr) if returncode != 0 else ""
+    text = str(response.get("result", ""))
+    if response.get("is_error"):
+        return returncode or 1, text, decode(stderr) or text
+    return returncode, text, decode(stderr) if returncode != 0 else ""
+
+class ResponseCache:
+    """Small TTL + LRU cache of successful Claude responses, keyed by prompt and working directory."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def key(prompt: str, cwd: Optional[str] = None) -> bytes:
+        h = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16)
+        h.update(b"\0" + os.path.abspath(cwd or ".").encode("utf-8"))
+        return h.digest()
+
+    async def get(self, key: bytes) -> Optional[str]:
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    async def put(self, key: bytes, text: str) -> None:
+        if self.ttl <= 0:
+            return
+        async with self._lock:
+            self._entries[key] = (time.monotonic(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+# Repeated ask_claude / analyze_url_content prompts are answered from here for CLAUDE_CACHE_TTL seconds
+_response_cache = ResponseCache(maxsize=128, ttl=float(os.environ.get("CLAUDE_CACHE_TTL", "600")))
+
+# Tool schemas as plain data; _init_server() turns them into mcp Tool objects once at startup
+_TOOL_SPECS = [
+    dict(
+        name="generate_code",
+        description="Generate code for a feature using Claude Code CLI",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "feature": {"type": "string", "description": "Feature description"},
+                "language": {"type": "string", "description": "Programming language"},
+                "context": {"type": "string", "description": "Additional context (URL/file content)"},
+                "output_dir": {"type": "string", "description": "Output directory", "default": "./"}
+            },
+            "required": ["feature", "language"]
+        }
+    ),
+    dict(
+        name="analyze_file",
+        description="Analyze and improve existing code file",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "file_path": {"type": "string", "description": "Path to file to analyze"},
+                "improvement_type": {"type": "string", "description": "Type of improvement needed"}
+            },
+            "required": ["file_path"]
+        }
+    ),
+    dict(
+        name="create_feature_branch",
+        description="Create a new feature branch for development",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "feature_name": {"type": "string", "description": "Name of the feature"},
+                "base_branch": {"type": "string", "description": "Base branch", "default": "main"}
+            },
+            "required": ["feature_name"]
+        }
+    ),
+    dict(
+        name="analyze_url_content",
+        description="Fetch and analyze web content for code generation",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "url": {"type": "string", "description": "Web URL to analyze"},
+                "language": {"type": "string", "description": "Target programming language"}
+            },
+            "required": ["url", "language"]
+        }
+    ),
+    dict(
+        name="ask_claude",
+        description="Ask Claude Code directly for development assistance",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "prompt": {"type": "string", "description": "Prompt to send to Claude Code"},
+                "working_dir": {"type": "string", "description": "Working directory", "default": "./"}
+            },
+            "required": ["prompt"]
+        }
+    )
+]
+
+async def generate_code_handler(args: Dict[str, Any]) -> str:
     feature = args["feature"]
     language = args["language"]
     context = args.get("context", "")
@@ -109,220 +284,187 @@ async def generate_code_handler(args: Dict[str, Any]) -> List[TextContent]:
     
     try:
         # Construct a comprehensive prompt for Claude Code
-        prompt_parts = [
-            f"I need to implement a feature in {language}:",
-            f"Feature: {feature}",
-            f"Output directory: {output_dir}",
-        ]
-        
-        if context:
-            prompt_parts.append(f"Additional context: {context}")
+        full_prompt = _GENERATE_PROMPT.format(
+            language=language,
+            feature=feature,
+            output_dir=output_dir,
+            context_block=f"Additional context: {context}\n" if context else ""
+        )
         
-        prompt_parts.extend([
-            "",
-            "Please:",
-            "1. Create the necessary files for this feature",
-            "2. Write clean, well-documented code",
-            "3. Follow best practices for the language",
-            "4. Include proper error handling",
-            "5. Add comments explaining the implementation",
-            "",
-            "Generate the complete implementation ready for production use."
-        ])
+        # Stat output_dir once; the default "./" is the server's own cwd and needs no check
+        dir_ok = output_dir not in ("", ".", "./") and os.path.isdir(output_dir)
         
-        full_prompt = "\n".join(prompt_parts)
+        # Execute Claude Code in the output directory
+        returncode, stdout, stderr = await run_claude(
+            full_prompt,
+            timeout=180,
+            cwd=output_dir if dir_ok else None
+        )
         
-        # Change to output directory
-        original_dir = os.getcwd()
-        try:
-            if output_dir != "./" and os.path.exists(output_dir):
-                os.chdir(output_dir)
-            
-            # Execute Claude Code
-            result = subprocess.run(
-                ["claude", "--print", full_prompt], 
-                capture_output=True, 
-                text=True, 
-                timeout=180,
-                cwd=output_dir if os.path.exists(output_dir) else original_dir
-            )
-            
-            if result.returncode == 0:
-                return [TextContent(
-                    type="text",
-                    text=f"✅ Code generation completed successfully!\n\nFeature: {feature}\nLanguage: {language}\nOutput Directory: {output_dir}\n\nClaude Code Response:\n{result.stdout}"
-                )]
-            else:
-                return [TextContent(
-                    type="text", 
-                    text=f"❌ Code generation failed:\nError: {result.stderr}\nOutput: {result.stdout}"
-                )]
-        finally:
-            os.chdir(original_dir)
+        if returncode == 0:
+            return f"✅ Code generation completed successfully!\n\nFeature: {feature}\nLanguage: {language}\nOutput Directory: {output_dir}\n\nClaude Code Response:\n{stdout}"
+        else:
+            return f"❌ Code generation failed:\nError: {stderr}\nOutput: {stdout}"
             
-    except subprocess.TimeoutExpired:
-        return [TextContent(type="text", text="⏰ Code generation timed out")]
+    except asyncio.TimeoutError:
+        return "⏰ Code generation timed out"
     except Exception as e:
-        return [TextContent(type="text", text=f"❌ Error: {str(e)}")]
+        return f"❌ Error: {str(e)}"
 
-async def analyze_file_handler(args: Dict[str, Any]) -> List[TextContent]:
+async def analyze_file_handler(args: Dict[str, Any]) -> str:
     file_path = args["file_path"]
     improvement_type = args.get("improvement_type", "general")
     
     try:
-        if not os.path.exists(file_path):
-            return [TextContent(type="text", text=f"❌ File not found: {file_path}")]
+        # Disk I/O runs in a worker thread so other tool calls keep progressing
+        if not await asyncio.to_thread(os.path.exists, file_path):
+            return f"❌ File not found: {file_path}"
         
-        # Read file content for context
-        with open(file_path, 'r', encoding='utf-8') as f:
-            file_content = f.read()
+        # Read the file as raw bytes; it is piped to Claude as-is, without a decode/encode round trip
+        file_bytes = await asyncio.to_thread(pathlib.Path(file_path).read_bytes)
         
-        # Create analysis prompt
-        prompt = f"""Please analyze this code file and provide {improvement_type} improvements:
-
-File: {file_path}
-
-Code:
-```
-{file_content}
-```
-
-Please provide:
-1. Code quality assessment
-2. Specific improvement suggestions
-3. Best practices recommendations
-4. Security considerations (if applicable)
-5. Performance optimization opportunities
-6. Refactored code examples where beneficial
-
-Focus on {improvement_type} improvements."""
+        # Create analysis prompt around the file content
+        header = _ANALYZE_PROMPT_HEAD.format(improvement_type=improvement_type, file_path=file_path)
+        footer = _ANALYZE_PROMPT_TAIL.format(improvement_type=improvement_type)
+        prompt = header.encode("utf-8") + file_bytes + footer.encode("utf-8")
         
         # Use Claude Code to analyze file
-        result = subprocess.run(
-            ["claude", "--print", prompt], 
-            capture_output=True, 
-            text=True, 
-            timeout=120
-        )
+        returncode, stdout, stderr = await run_claude(prompt, timeout=120)
         
-        if result.returncode == 0:
-            return [TextContent(
-                type="text",
-                text=f"✅ File analysis completed!\n\nFile: {file_path}\nImprovement Type: {improvement_type}\n\nAnalysis:\n{result.stdout}"
-            )]
+        if returncode == 0:
+            return f"✅ File analysis completed!\n\nFile: {file_path}\nImprovement Type: {improvement_type}\n\nAnalysis:\n{stdout}"
         else:
-            return [TextContent(
-                type="text",
-                text=f"❌ File analysis failed:\nError: {result.stderr}"
-            )]
+            return f"❌ File analysis failed:\nError: {stderr}"
             
+    except asyncio.TimeoutError:
+        return "⏰ File analysis timed out"
     except Exception as e:
-        return [TextContent(type="text", text=f"❌ Error analyzing file: {str(e)}")]
+        return f"❌ Error analyzing file: {str(e)}"
 
-async def create_feature_branch_handler(args: Dict[str, Any]) -> List[TextContent]:
+async def create_feature_branch_handler(args: Dict[str, Any]) -> str:
     feature_name = args["feature_name"]
     base_branch = args.get("base_branch", "main")
     
     try:
         # Sanitize branch name
-        branch_name = f"feature/{re.sub(r'[^a-zA-Z0-9]', '-', feature_name.lower())}"
-        
-        # Git operations
-        commands = [
-            ["git", "checkout", base_branch],
-            ["git", "pull", "origin", base_branch],
-            ["git", "checkout", "-b", branch_name]
-        ]
+        branch_name = f"feature/{_BRANCH_RE.sub('-', feature_name.lower())}"
         
         outputs = []
+        
+        def record(cmd: List[str], returncode: int, stdout: str, stderr: str) -> None:
+            outputs.append(f"$ {' '.join(cmd)}\n{stdout}")
+            if returncode != 0:
+                outputs.append(f"Warning: {stderr}")
+        
+        # Read-only probe; skips the checkout when the base branch is already checked out
+        _, current_branch, _ = await run_command(["git", "rev-parse", "--abbrev-ref", "HEAD"])
+        
+        # Order-dependent git operations (checkout -> pull -> branch); `git pull` honours the
+        # user's pull.rebase / pull.ff settings (current git refuses to merge diverged history)
+        commands = []
+        if current_branch.strip() != base_branch:
+            commands.append(["git", "checkout", base_branch])
+        commands.append(["git", "pull", "origin", base_branch])
+        commands.append(["git", "checkout", "-b", branch_name])
+        
         for cmd in commands:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            outputs.append(f"$ {' '.join(cmd)}\n{result.stdout}")
-            if result.returncode != 0:
-                outputs.append(f"Warning: {result.stderr}")
+            record(cmd, *await run_command(cmd))
         
-        return [TextContent(
-            type="text",
-            text=f"✅ Feature branch '{branch_name}' created successfully!\n\n" + "\n".join(outputs)
-        )]
+        return f"✅ Feature branch '{branch_name}' created successfully!\n\n" + "\n".join(outputs)
         
     except Exception as e:
-        return [TextContent(type="text", text=f"❌ Error creating branch: {str(e)}")]
+        return f"❌ Error creating branch: {str(e)}"
 
-async def analyze_url_content_handler(args: Dict[str, Any]) -> List[TextContent]:
+async def analyze_url_content_handler(args: Dict[str, Any]) -> str:
     url = args["url"]
     language = args["language"]
     
     try:
         # Create comprehensive prompt for URL analysis
-        prompt = f"""Please analyze the content at this URL and help me implement integration code:
-
-URL: {url}
-Target Language: {language}
-
-Please:
-1. Fetch and analyze the content at the URL
-2. Identify key information relevant for {language} integration
-3. Suggest implementation approach
-4. Provide code examples for integration
-5. Include error handling and best practices
-6. Consider security implications
-
-Generate ready-to-use {language} code for working with this URL/API."""
+        prompt = _URL_PROMPT.format(url=url, language=language)
+        cache_key = ResponseCache.key(prompt)
+        cached = await _response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         # Use Claude Code with web fetch capability
-        result = subprocess.run(
-            ["claude", "--print", prompt], 
-            capture_output=True, 
-            text=True, 
-            timeout=120
-        )
+        returncode, stdout, stderr = await run_claude(prompt, timeout=120)
         
-        if result.returncode == 0:
-            return [TextContent(
-                type="text",
-                text=f"✅ URL content analyzed!\n\nURL: {url}\nTarget Language: {language}\n\nAnalysis and Implementation:\n{result.stdout}"
-            )]
+        if returncode == 0:
+            text = f"✅ URL content analyzed!\n\nURL: {url}\nTarget Language: {language}\n\nAnalysis and Implementation:\n{stdout}"
+            await _response_cache.put(cache_key, text)
+            return text
         else:
-            return [TextContent(
-                type="text", 
-                text=f"❌ Failed to analyze URL: {url}\nError: {result.stderr}"
-            )]
+            return f"❌ Failed to analyze URL: {url}\nError: {stderr}"
             
+    except asyncio.TimeoutError:
+        return "⏰ URL analysis timed out"
     except Exception as e:
-        return [TextContent(type="text", text=f"❌ Error analyzing URL: {str(e)}")]
+        return f"❌ Error analyzing URL: {str(e)}"
 
-async def ask_claude_handler(args: Dict[str, Any]) -> List[TextContent]:
+async def ask_claude_handler(args: Dict[str, Any]) -> str:
     prompt = args["prompt"]
     working_dir = args.get("working_dir", "./")
     
     try:
+        cache_key = ResponseCache.key(prompt, working_dir)
+        cached = await _response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         # Execute Claude Code with the prompt
-        result = subprocess.run(
-            ["claude", "--print", prompt], 
-            capture_output=True, 
-            text=True, 
-            timeout=120,
-            cwd=working_dir
-        )
+        returncode, stdout, stderr = await run_claude(prompt, timeout=120, cwd=working_dir)
         
-        if result.returncode == 0:
-            return [TextContent(
-                type="text",
-                text=f"✅ Claude Code Response:\n\n{result.stdout}"
-            )]
+        if returncode == 0:
+            text = f"✅ Claude Code Response:\n\n{stdout}"
+            await _response_cache.put(cache_key, text)
+            return text
         else:
-            return [TextContent(
-                type="text",
-                text=f"❌ Claude Code Error:\n{result.stderr}"
-            )]
+            return f"❌ Claude Code Error:\n{stderr}"
             
-    except subprocess.TimeoutExpired:
-        return [TextContent(type="text", text="⏰ Claude Code request timed out")]
+    except asyncio.TimeoutError:
+        return "⏰ Claude Code request timed out"
     except Exception as e:
-        return [TextContent(type="text", text=f"❌ Error: {str(e)}")]
+        return f"❌ Error: {str(e)}"
+
+# Tool name -> handler, used by call_tool for O(1) dispatch
+_HANDLERS = {
+    "generate_code": generate_code_handler,
+    "analyze_file": analyze_file_handler,
+    "create_feature_branch": create_feature_branch_handler,
+    "analyze_url_content": analyze_url_content_handler,
+    "ask_claude": ask_claude_handler
+}
+
+def _init_server():
+    """Create the MCP server and register its tools."""
+    # mcp (and pydantic behind it) is imported here so importing this module stays cheap
+    from mcp.server import Server
+    from mcp.types import Tool, TextContent
+    
+    # Initialize MCP server
+    server = Server("claude-code-developer")
+    
+    # Tool schemas are constant, so build them once instead of on every tools/list request
+    tools = [Tool(**spec) for spec in _TOOL_SPECS]
+    
+    @server.list_tools()
+    async def list_tools() -> List[Tool]:
+        return tools
+    
+    @server.call_tool()
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+        handler = _HANDLERS.get(name)
+        if handler is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return [TextContent(type="text", text=await handler(arguments))]
+    
+    return server
 
 async def main():
+    from mcp.server.stdio import stdio_server
+    
+    server = _init_server()
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream, 
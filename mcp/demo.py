@@ -4,8 +4,6 @@ Demo script showing MCP servers functionality
 """
 
 import asyncio
-import json
-import subprocess
 import tempfile
 import os
 
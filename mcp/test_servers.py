@@ -3,48 +3,48 @@
 Test script for MCP servers
 """
 
-import subprocess
 import json
 import asyncio
 import time
-import os
+import sys
+
+# The interpreter running this script, so the servers see the same environment (e.g. a venv with mcp)
+PYTHON_CMD = sys.executable
 
 async def test_mcp_server(server_path, server_name):
     """Test an MCP server by starting it and checking basic functionality"""
     print(f"\n🧪 Testing {server_name}...")
     
     try:
-        # Start the server process (use python instead of python3 for Windows compatibility)
-        python_cmd = "python3" if os.name != "nt" else "python"
-        process = subprocess.Popen(
-            [python_cmd, server_path],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+        # Start the server process
+        process = await asyncio.create_subprocess_exec(
+            PYTHON_CMD, server_path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
         
         # Give it a moment to start
         await asyncio.sleep(0.5)
         
         # Check if process is still running
-        if process.poll() is None:
+        if process.returncode is None:
             print(f"✅ {server_name} started successfully")
             
             # Terminate the process
             process.terminate()
             try:
-                process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(process.wait(), timeout=2)
+            except asyncio.TimeoutError:
                 process.kill()
-                process.wait()
+                await process.wait()
             
             return True
         else:
-            stdout, stderr = process.communicate()
+            stdout, stderr = await process.communicate()
             print(f"❌ {server_name} failed to start")
             if stderr:
-                print(f"Error: {stderr}")
+                print(f"Error: {stderr.decode(errors='replace')}")
             return False
             
     except Exception as e:
@@ -55,15 +55,16 @@ async def main():
     print("🚀 Testing MCP Servers")
     print("=" * 50)
     
-    # Test both servers
-    claude_result = await test_mcp_server(
-        "/mnt/h/code/yl/aisoft/mcp/claude-code-developer/server.py",
-        "Claude Code Developer MCP Server"
-    )
-    
-    gemini_result = await test_mcp_server(
-        "/mnt/h/code/yl/aisoft/mcp/gemini-qa-agent/server.py", 
-        "Gemini QA Agent MCP Server"
+    # Test both servers at once
+    claude_result, gemini_result = await asyncio.gather(
+        test_mcp_server(
+            "/mnt/h/code/yl/aisoft/mcp/claude-code-developer/server.py",
+            "Claude Code Developer MCP Server"
+        ),
+        test_mcp_server(
+            "/mnt/h/code/yl/aisoft/mcp/gemini-qa-agent/server.py", 
+            "Gemini QA Agent MCP Server"
+        )
     )
     
     print("\n📊 Test Results:")